@@ -0,0 +1,170 @@
+import argparse
+import math
+import random
+import re
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+import ulva_auto_mto_extractor as mto
+
+
+def test_pdf_text_tabular_parity(tmp_path, monkeypatch):
+    # One cell per text object, three cells per row – PyMuPDF must rebuild rows like pdfplumber
+    pymupdf = pytest.importorskip('pymupdf')
+    pdfplumber = pytest.importorskip('pdfplumber')
+    rows = [('<1>', '2500', '150'), ('90 ELBOW', 'DN150', ''), ('FLANGE', '100', ''),
+            ('<2>', '1200', '50'), ('BW TEE', '100', '50')]
+    doc = pymupdf.open()
+    page = doc.new_page()
+    for r, cells in enumerate(rows):
+        for c, cell in enumerate(cells):
+            if cell:
+                page.insert_text((50 + c*120, 80 + r*20), cell)
+    pdf = tmp_path / 'tab.pdf'
+    doc.save(pdf)
+
+    monkeypatch.setattr(mto, 'pymupdf', pymupdf)
+    fast = mto.parse_all(mto.pdf_text(pdf))
+    monkeypatch.setattr(mto, 'pymupdf', None)
+    monkeypatch.setattr(mto, 'pdfplumber', pdfplumber, raising=False)
+    assert fast == mto.parse_all(mto.pdf_text(pdf))
+    assert fast == ([(2500, 150), (1200, 50)],
+                    [('Elbow90', 90), ('EndCap', 100), ('UnequalTee', 100, 50)])
+
+
+# Pre-fusion parsers, kept as the reference for parse_all
+_cut_rx = re.compile(r"<\d+>\s+(\d{2,5})\s+(\d{2,3})")
+
+def _old_parse(txt):
+    cuts = [(int(l), int(dn)) for l, dn in _cut_rx.findall(txt)]
+    items = []
+    for ln in txt.splitlines():
+        l = ln.lower()
+        if '45' in l and 'elbow' in l:
+            items.append(('Elbow45', int(re.search(r"(\d{2,3})", ln).group(1))))
+        elif '90' in l and 'elbow' in l:
+            items.append(('Elbow90', int(re.search(r"(\d{2,3})", ln).group(1))))
+        elif ' tee' in l:
+            dns = [int(n) for n in re.findall(r"(\d{2,3})", ln)]
+            if len(dns) >= 2:
+                items.append(('EqualTee' if dns[0] == dns[1] else 'UnequalTee', dns[0], dns[1]))
+        elif 'flange' in l or 'valve' in l:
+            items.append(('EndCap', int(re.search(r"(\d{2,3})", ln).group(1))))
+        elif 'weldolet' in l or 'threadolet' in l:
+            dn = int(re.search(r"(\d{2,3})", ln).group(1))
+            if dn < mto.DN_COLLAR:
+                items.append(('Collar', dn))
+        elif 'clamp' in l:
+            items.append(('ClampCover', int(re.search(r"(\d{2,3})", ln).group(1))))
+    return cuts, items
+
+def _outcome(parse, txt):
+    try:
+        return parse(txt)
+    except AttributeError:  # fitting keyword without a DN
+        return 'AttributeError'
+
+_TOKENS = ['<1>', '<23>', '1200', '3000', '150', '50', '300', '45', '90', 'elbow', 'ELBOW',
+           ' tee', 'tee', 'flange', 'valve', 'weldolet', 'threadolet', 'clamp', 'steel',
+           'DN100', ' ', '  ', '\n', '\r', '\r\n', '\x0c', '\x85', '\u2028', '\xa0',
+           '\u2003', 'Ø', '90°', 'x']
+
+def _fuzz_texts(n=3000):
+    rnd = random.Random(0)
+    yield from ['<1> 3000\n150 valve\n', '<1>\n1200\n150 90 ELBOW\n',
+                '<1> 2500 100 ELBOW 90 DN100', '<1>\xa01200\xa0150', '<1> \u2003 1200 150',
+                '90 elbow 100\rflange 50', 'valve 80\x0cclamp 65', '<1> 2500 150\x85BW tee 100 50']
+    for _ in range(n):
+        yield ''.join(rnd.choice(_TOKENS) + rnd.choice(['', ' ', '\n'])
+                      for _ in range(rnd.randint(1, 12)))
+
+@pytest.mark.parametrize('engine', ['re', 'hyperscan'])
+def test_parse_all_matches_old_parsers(engine, monkeypatch):
+    if engine == 're':
+        monkeypatch.setattr(mto, 'hyperscan', None)
+    elif not mto.hyperscan:
+        pytest.skip('hyperscan not installed')
+    for txt in _fuzz_texts():
+        assert _outcome(mto.parse_all, txt) == _outcome(_old_parse, txt), repr(txt)
+
+
+def test_page_list():
+    pages = mto.page_list('1-3,7,2,8-9,5-100000000')
+    assert pages == ((1, 3), (5, 100000000))
+    assert 4 not in pages and 7 in pages and 100000000 in pages
+    assert pages.numbers(6) == [1, 2, 3, 5, 6]
+    for spec, msg in [('5-3', 'range end before start'), ('0-2', 'pages start at 1'),
+                      ('x', 'invalid page list')]:
+        with pytest.raises(argparse.ArgumentTypeError, match=msg):
+            mto.page_list(spec)
+
+
+@pytest.mark.parametrize('backend', ['pymupdf', 'pdfplumber'])
+def test_pdf_text_cut_across_page_break(backend, tmp_path, monkeypatch):
+    pymupdf = pytest.importorskip('pymupdf')
+    doc = pymupdf.open()
+    for text in ['<1> 2500', '150', 'GENERAL NOTES', '', '<2> 1200', '', '50']:
+        page = doc.new_page()
+        if text:
+            page.insert_text((50, 80), text)
+    pdf = tmp_path / 'split.pdf'
+    doc.save(pdf)
+
+    if backend == 'pdfplumber':
+        monkeypatch.setattr(mto, 'pymupdf', None)
+        monkeypatch.setattr(mto, 'pdfplumber', pytest.importorskip('pdfplumber'), raising=False)
+    txt = mto.pdf_text(pdf)
+    assert 'GENERAL NOTES' not in txt
+    assert mto.parse_all(txt) == ([(2500, 150), (1200, 50)], [])
+
+
+def test_parse_pdf_cache(tmp_path, monkeypatch):
+    pymupdf = pytest.importorskip('pymupdf')
+    doc = pymupdf.open()
+    doc.new_page().insert_text((50, 80), '<1> 2500 150')
+    pdf = tmp_path / 'a.pdf'
+    doc.save(pdf)
+    monkeypatch.setattr(mto, 'CACHE_DIR', tmp_path / 'cache')
+    monkeypatch.setattr(mto, 'pymupdf', pymupdf)
+
+    assert mto.parse_pdf(pdf) == ([(2500, 150)], [])
+    entry, = (tmp_path / 'cache').iterdir()
+    entry.write_bytes(b'not a pickle')  # corrupt entry is a miss, then rewritten
+    assert mto.parse_pdf(pdf) == ([(2500, 150)], [])
+    assert mto.pickle.loads(entry.read_bytes()) == ([(2500, 150)], [])
+
+    monkeypatch.setattr(mto, 'pymupdf', None)  # other backend, other entry
+    monkeypatch.setattr(mto, 'pdfplumber', pytest.importorskip('pdfplumber'), raising=False)
+    mto.parse_pdf(pdf)
+    assert len(list((tmp_path / 'cache').iterdir())) == 2
+
+
+def test_calc_straights_kernels_agree():
+    Lmm = np.array([1200, 2500, 10, 3000, 999, 1000], dtype='i4')
+    dn = np.array([100, 999, 15, 70, 50, 600], dtype='i4')  # 999 and 70 are not in OD
+    kernels = [mto.calc_straights_np, mto.calc_straights_loop, mto.calc_straights]
+    for lengths, dns in [(Lmm, dn), (Lmm[:0], dn[:0])]:
+        ref = mto.calc_straights_np(lengths, dns, 20)
+        for kernel in kernels[1:]:
+            for got, want in zip(kernel(lengths, dns, 20), ref):
+                np.testing.assert_allclose(got, want, rtol=1e-12)
+    L, C, _, _ = mto.calc_straights_np(Lmm, dn, 20)
+    assert L.tolist() == [2, 3, 1, 3, 1, 1]
+    assert C[1] == pytest.approx(math.pi*(999 + 40)/1000)  # unknown DN: OD = DN
+    assert C[3] == pytest.approx(math.pi*(70 + 40)/1000)
+
+
+def test_process_pdf_totals(monkeypatch):
+    # DN100 (OD 114.3), DN150 (OD 168.3), DN50 (OD 60.3) at 20 mm insulation
+    monkeypatch.setattr(mto, 'parse_pdf', lambda path, pages=None: (
+        [(2500, 100), (12500, 150)], [('Elbow90', 100), ('EndCap', 50)]))
+    straights, fits, summary = mto.process_pdf(Path('a.pdf'), 20)
+    # clad: (0.484748+0.05)*3 + (0.654398+0.05)*13; bead: 3+2*0.484748 + 13+2*0.654398
+    #   + elbow 0.5*0.484748 + endcap 0.315102; bond: 3.484748 + 13.654398 + 2*0.242374 + 0.315102
+    assert summary == {'Clad_m2': 10.76, 'Bead_m': 18.84, 'Tubes': 4, 'Bond_tins': 1}
+    assert straights['Length_m'].tolist() == [3, 13]
+    assert straights['Shield_£'].tolist() == [58.94, 336.43]
+    assert fits['Elbow90']['Bead_m'].tolist() == [0.242]
+    assert fits['EndCap']['Bead_m'].tolist() == [0.315]
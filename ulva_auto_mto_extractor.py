@@ -25,14 +25,28 @@ Output:
   - Summary tab with all totals and costs
 
 Usage:
-  python ulva_auto_mto_extractor.py [--thickness MM]
+  python ulva_auto_mto_extractor.py [--thickness MM] [--pages 1-20,100]
   Drop PDFs into pdf_in/ and run. Excel saved to mto_out/.
 """
-import sys, re, math, datetime, argparse
+import sys, re, math, datetime, argparse, functools, multiprocessing, hashlib, pickle
+from concurrent.futures import ProcessPoolExecutor
 from math import pi, ceil
 from pathlib import Path
-import pandas as pd
-import pdfplumber
+import numpy as np
+import xlsxwriter
+try:
+    import pymupdf   # PyMuPDF (fitz) – fast text extraction
+except ImportError:
+    pymupdf = None
+    import pdfplumber
+try:
+    import hyperscan  # optional DFA scanner for parse_all
+except ImportError:
+    hyperscan = None
+try:
+    from numba import njit  # optional JIT for the straights kernel
+except ImportError:
+    njit = None
 
 # Defaults
 DEFAULT_THK = 20     # mm insulation thickness
@@ -42,6 +56,8 @@ LAP = 0.05           # m longitudinal lap (50 mm)
 TUBE_COVER_M = 6     # m per ULVASeal tube
 BOND_STRIP_W = 0.1   # m (100 mm strip)
 DN_COLLAR = 250      # DN threshold for collar
+CACHE_DIR = Path('.mto_cache')
+CACHE_VER = 2        # bump when PDF text extraction/parsing changes to invalidate the cache
 
 # Rates (£)
 RATE_SHIELD = 36.74  # per m²
@@ -53,81 +69,192 @@ RATE_CLAMP = 24.00   # per clamp cover
 OD = {15:21.3,20:26.9,25:33.7,32:42.4,40:48.3,50:60.3,65:76.1,
       80:88.9,90:101.6,100:114.3,125:141.3,150:168.3,200:219.1,
       250:273.0,300:323.9,350:355.6,400:406.4,450:457.0,500:508.0,600:610.0}
+# Dense OD table indexed by DN (any 2–3 digit DN); unknown DNs map to themselves like OD.get(dn,dn)
+OD_ARR = np.arange(1000, dtype=float)
+OD_ARR[list(OD)] = list(OD.values())
 
-# CLI
-p = argparse.ArgumentParser()
-p.add_argument('-t','--thickness',type=int,default=DEFAULT_THK,
-               help=f'Insulation thickness (mm) {MIN_THK}-{MAX_THK}')
-args = p.parse_args()
-if args.thickness < MIN_THK or args.thickness > MAX_THK:
-    sys.exit(f'Error: thickness must be {MIN_THK}-{MAX_THK} mm')
-INS_THK = args.thickness
+# Fitting sheet columns (stored column-wise, one list per column)
+FIT_COLS = {'Elbow45':['PDF','DN','Bead_m'],'Elbow90':['PDF','DN','Bead_m'],
+            'EqualTee':['PDF','DN_main','DN_branch','Bead_m'],
+            'UnequalTee':['PDF','DN_main','DN_branch','Bead_m'],
+            'EndCap':['PDF','DN','Bead_m'],'Collar':['PDF','DN','Bead_m'],
+            'ClampCover':['PDF','DN','Clamp_£']}
 
 # Helpers
-def circ_m(dn):
-    od = OD.get(dn, dn) + 2*INS_THK
-    return pi*od/1000
+def circ_m(dn, thk):
+    # Insulated circumference (m) for a DN or an array of DNs
+    return np.pi*(OD_ARR[np.asarray(dn,dtype=np.int64)] + 2*thk)/1000
+
+FIT_KW = r"elbow|tee|flange|valve|weldolet|threadolet|clamp"
+CUT_PAT = r"<\d+>\s+(\d{2,5})\s+(\d{2,3})"
+
+dn_rx = re.compile(r"(\d{2,3})")
+cut_rx = re.compile(CUT_PAT)
+page_rx = re.compile(rf"{FIT_KW}|<\d+>",re.I)  # page worth parsing at all?
+mark_rx = re.compile(r"<\d+>")
+if hyperscan:
+    # Keywords + cut-marker starts in one automaton; Hyperscan only finds candidate
+    # offsets, the str regexes above decide (Unicode \s/\d, same as the re path)
+    hs_db = hyperscan.Database()
+    hs_utf = hyperscan.HS_FLAG_UTF8|hyperscan.HS_FLAG_UCP
+    hs_db.compile(expressions=[FIT_KW.encode(),rb"<\d+>"],ids=[0,1],
+                  flags=[hyperscan.HS_FLAG_CASELESS|hs_utf,hyperscan.HS_FLAG_SOM_LEFTMOST|hs_utf])
+
+# Fitting handlers: (line, lowered line) -> item or None
+def fit_elbow(ln, l):
+    for angle in ('45','90'):
+        if angle in l: return ('Elbow'+angle,int(dn_rx.search(ln).group(1)))
+
+def fit_tee(ln, l):
+    dns=[int(n) for n in dn_rx.findall(ln)]
+    if len(dns)>=2:
+        typ='EqualTee' if dns[0]==dns[1] else 'UnequalTee'
+        return (typ,dns[0],dns[1])
+
+def fit_endcap(ln, l):
+    return ('EndCap',int(dn_rx.search(ln).group(1)))
 
-cut_rx = re.compile(r"<\d+>\s+(\d{2,5})\s+(\d{2,3})")
-parse_cuts = lambda txt: [(int(l),int(dn)) for l,dn in cut_rx.findall(txt)]
+def fit_collar(ln, l):
+    dn=int(dn_rx.search(ln).group(1))
+    if dn < DN_COLLAR: return ('Collar',dn)
 
-def parse_fittings(txt):
+def fit_clamp(ln, l):
+    return ('ClampCover',int(dn_rx.search(ln).group(1)))
+
+# Keyword -> handler, in priority order (an elbow line mentioning a flange is an elbow).
+# The first keyword present decides the line; only an elbow without 45/90 falls through.
+FIT_DISPATCH = {'elbow':fit_elbow,' tee':fit_tee,'flange':fit_endcap,'valve':fit_endcap,
+                'weldolet':fit_collar,'threadolet':fit_collar,'clamp':fit_clamp}
+FIT_RANK = {kw:i for i,kw in enumerate(FIT_DISPATCH)}
+kw_rx = re.compile('|'.join(FIT_DISPATCH))
+
+def fitting_item(ln):
+    l=ln.lower()
+    for kw in sorted(set(kw_rx.findall(l)),key=FIT_RANK.get):
+        item=FIT_DISPATCH[kw](ln,l)
+        if item or kw!='elbow': return item
+
+def parse_all_hs(txt):
+    data=txt.encode(); fit_lines=set(); cut_starts=set()
+    def on_match(id,start,end,flags,ctx):
+        if id: cut_starts.add(start)
+        else: fit_lines.add(data.rfind(b'\n',0,end)+1)
+    hs_db.scan(data,match_event_handler=on_match)
+    # Byte offsets -> str offsets, decoding only the gaps between hits
+    chars={}; b=c=0
+    for o in sorted(fit_lines|cut_starts):
+        c+=len(data[b:o].decode()); b=o; chars[o]=c
+    cuts=[]; items=[]
+    for st in sorted(cut_starts):  # cuts start at '<' and hold no other '<' – never overlap
+        m=cut_rx.match(txt,chars[st])
+        if m: cuts.append((int(m.group(1)),int(m.group(2))))
+    for ls in sorted(fit_lines):
+        i=chars[ls]; j=txt.find('\n',i)
+        item=fitting_item(txt[i:j if j>=0 else len(txt)])
+        if item: items.append(item)
+    return cuts,items
+
+def parse_all(txt):
+    txt='\n'.join(txt.splitlines())  # \r, \f, \x85, \u2028… also end a line
+    if hyperscan: return parse_all_hs(txt)
+    # Two plain scans beat one fused regex here: cut_rx has a literal '<' prefix,
+    # and substring tests on the lowered line reject notes faster than any re
+    cuts=[(int(L),int(dn)) for L,dn in cut_rx.findall(txt)]
     items=[]
-    for ln in txt.splitlines():
+    for ln in txt.split('\n'):
         l=ln.lower()
-        if '45' in l and 'elbow' in l:
-            dn=int(re.search(r"(\d{2,3})",ln).group(1)); items.append(('Elbow45',dn))
-        elif '90' in l and 'elbow' in l:
-            dn=int(re.search(r"(\d{2,3})",ln).group(1)); items.append(('Elbow90',dn))
-        elif ' tee' in l:
-            dns=[int(n) for n in re.findall(r"(\d{2,3})",ln)]
-            if len(dns)>=2:
-                typ='EqualTee' if dns[0]==dns[1] else 'UnequalTee'
-                items.append((typ,dns[0],dns[1]))
-        elif 'flange' in l or 'valve' in l:
-            dn=int(re.search(r"(\d{2,3})",ln).group(1)); items.append(('EndCap',dn))
-        elif ('weldolet' in l or 'threadolet' in l):
-            dn=int(re.search(r"(\d{2,3})",ln).group(1))
-            if dn < DN_COLLAR: items.append(('Collar',dn))
-        elif 'clamp' in l:
-            dn=int(re.search(r"(\d{2,3})",ln).group(1)); items.append(('ClampCover',dn))
-    return items
+        if ('elbow' in l or 'tee' in l or 'flange' in l or 'valve' in l
+                or 'olet' in l or 'clamp' in l):
+            item=fitting_item(ln)
+            if item: items.append(item)
+    return cuts,items
+
+def calc_straights_np(Lmm, dn, thk):
+    C=circ_m(dn,thk)
+    L=np.ceil(Lmm/1000).astype(np.int64)
+    return L, C, (C+LAP)*L, L + 2*C
+
+def calc_straights_loop(Lmm, dn, thk):
+    # Same maths fused into one loop – with numba: no temporaries, LLVM vectorises it
+    n=len(Lmm)
+    L=np.empty(n,np.int64); C=np.empty(n); clad=np.empty(n); bead=np.empty(n)
+    for i in range(n):
+        c=pi*(OD_ARR[dn[i]] + 2*thk)/1000
+        l=ceil(Lmm[i]/1000)
+        L[i]=l; C[i]=c; clad[i]=(c+LAP)*l; bead[i]=l + 2*c
+    return L, C, clad, bead
+
+# Interpreted, the loop is slower than the NumPy expressions – only use it compiled
+calc_straights = njit(cache=True)(calc_straights_loop) if njit else calc_straights_np
 
 # Process PDF
-def process_pdf(path):
-    txt='\n'.join(p.extract_text() or '' for p in pdfplumber.open(path).pages)
-    # Straights
-    straights=[]; total_clad=0; bond_len=0; bead_sum=0
-    for Lmm,dn in parse_cuts(txt):
-        L=ceil(Lmm/1000)
-        C=circ_m(dn)
-        clad_m2=(C+LAP)*L
-        bead=L + 2*C
-        straights.append({'PDF':path.name,'DN':dn,'Length_m':L,'Circ_m':round(C,3),
-                          'Clad_m2':round(clad_m2,3),'Bead_m':round(bead,3),
-                          'Shield_£':round(clad_m2*RATE_SHIELD,2)})
-        total_clad+=clad_m2; bond_len+=L + C; bead_sum+=bead
+def pdf_text(path, pages=None):
+    # pages: PageRanges of 1-indexed pages to read (None = all). Title/notes/legend pages
+    # carry no cuts or fittings – drop them before parsing (see relevant_pages)
+    if pymupdf:
+        with pymupdf.open(path) as doc:
+            nums=range(doc.page_count) if pages is None else [n-1 for n in pages.numbers(doc.page_count)]
+            texts=[doc[i].get_text('text',sort=True) for i in nums]  # sort: rebuild rows like pdfplumber
+    else:
+        with pdfplumber.open(path,pages=pages) as pdf:
+            texts=[p.extract_text() or '' for p in pdf.pages]
+    return '\n'.join(relevant_pages(texts))
+
+def relevant_pages(texts):
+    # A cut can run over a page break ('<1> 2500' | '150'), so the page after one
+    # with a cut marker is kept too (past blank pages)
+    spill=False
+    for t in texts:
+        if spill or page_rx.search(t): yield t
+        spill=bool(mark_rx.search(t)) or (spill and not t.strip())
+
+def parse_pdf(path, pages=None):
+    # Cuts/fittings don't depend on thickness or rates, so only the slow
+    # extract+parse is cached; re-runs recompute the maths from it
+    h=hashlib.blake2b(path.read_bytes(),digest_size=16)
+    h.update(path.name.encode())
+    h.update(repr(pages).encode())
+    h.update(b'pymupdf' if pymupdf else b'pdfplumber')  # backends extract different text
+    cache=CACHE_DIR/f'{h.hexdigest()}_v{CACHE_VER}.pkl'
+    try:
+        return pickle.loads(cache.read_bytes())
+    except Exception:  # missing, truncated or corrupt – treat as a miss and rewrite
+        pass
+    res=parse_all(pdf_text(path,pages))
+    CACHE_DIR.mkdir(exist_ok=True)
+    tmp=cache.with_suffix(f'.{multiprocessing.current_process().pid}.tmp')
+    tmp.write_bytes(pickle.dumps(res)); tmp.replace(cache)
+    return res
+
+def process_pdf(path, thk, pages=None):
+    cuts,items=parse_pdf(path,pages)
+    # Straights (vectorised over all cuts)
+    cut=np.fromiter(cuts,dtype=[('L','i4'),('dn','i4')],count=len(cuts))
+    L,C,clad,bead=calc_straights(cut['L'],cut['dn'],thk)
+    straights={'PDF':np.full(len(cut),path.name,dtype=object),'DN':cut['dn'],'Length_m':L,
+               'Circ_m':C.round(3),'Clad_m2':clad.round(3),'Bead_m':bead.round(3),
+               'Shield_£':(clad*RATE_SHIELD).round(2)}
+    total_clad=float(clad.sum()); bond_len=float((L+C).sum()); bead_sum=float(bead.sum())
     # Fittings
-    fits={k:[] for k in ['Elbow45','Elbow90','EqualTee','UnequalTee','EndCap','Collar','ClampCover']}
-    for item in parse_fittings(txt):
-        key=item[0]
-        if key.startswith('Elbow'):
-            angle=int(key[5:]); dn=item[1]
-            arc=(angle/360)*2*pi*(OD.get(dn,dn)+2*INS_THK)/1000
-            fits[key].append({'PDF':path.name,'DN':dn,'Bead_m':round(arc,3)})
-            bead_sum+=arc; bond_len+=arc*2
-        elif key in ['EqualTee','UnequalTee']:
-            hdr,br=item[1],item[2]
-            bead=2*circ_m(hdr)+circ_m(br)
-            fits[key].append({'PDF':path.name,'DN_main':hdr,'DN_branch':br,'Bead_m':round(bead,3)})
-            bead_sum+=bead; bond_len+=bead
-        elif key in ['EndCap','Collar']:
-            dn=item[1]; b=circ_m(dn)
-            fits[key].append({'PDF':path.name,'DN':dn,'Bead_m':round(b,3)})
-            bead_sum+=b; bond_len+=b
-        elif key=='ClampCover':
-            dn=item[1]; fits[key].append({'PDF':path.name,'DN':dn,'Clamp_£':RATE_CLAMP})
-            bond_len+=dn*0  # no bond length
+    fits={k:{c:[] for c in cols} for k,cols in FIT_COLS.items()}
+    for item in items:
+        f=fits[item[0]]
+        f['PDF'].append(path.name)
+        if len(item)==3: f['DN_main'].append(item[1]); f['DN_branch'].append(item[2])
+        else: f['DN'].append(item[1])
+    beads={}
+    for key in ['Elbow45','Elbow90']:  # heel arc
+        beads[key]=(int(key[5:])/360)*2*circ_m(fits[key]['DN'],thk)
+    for key in ['EqualTee','UnequalTee']:
+        beads[key]=2*circ_m(fits[key]['DN_main'],thk)+circ_m(fits[key]['DN_branch'],thk)
+    for key in ['EndCap','Collar']:
+        beads[key]=circ_m(fits[key]['DN'],thk)
+    for key,b in beads.items(): fits[key]['Bead_m']=b.round(3)
+    fits['ClampCover']['Clamp_£']=[RATE_CLAMP]*len(fits['ClampCover']['DN'])  # no bond length
+    # One reduction per fitting type; elbows count twice towards bond length
+    fit_bead=float(sum(b.sum() for b in beads.values()))
+    elbow_bead=float(beads['Elbow45'].sum()+beads['Elbow90'].sum())
+    bead_sum+=fit_bead; bond_len+=fit_bead+elbow_bead
     # Totals
     total_bead=bead_sum
     tubes=ceil(total_bead/TUBE_COVER_M)
@@ -137,35 +264,97 @@ def process_pdf(path):
              'Tubes':tubes,'Bond_tins':tins}
     return straights,fits,summary
 
+# Excel
+def sort_cols(cols, key):
+    idx=np.argsort(cols[key],kind='stable')
+    return {k:v[idx] for k,v in cols.items()}
+
+def col_width(arr):
+    if not len(arr): return 0
+    if arr.dtype.kind in 'iuf':  # bounded by the extremes – skip str() per cell
+        return max(len(str(arr.max())),len(str(arr.min())))
+    return int(np.char.str_len(arr.astype(str)).max())
+
+# CLI
+class PageRanges(tuple):
+    # Sorted, merged ((start, end), ...) 1-indexed inclusive ranges; `n in ranges`
+    # works without expanding them, so '1-100000000' costs nothing up front
+    def __contains__(self, n):
+        return any(a <= n <= b for a,b in self)
+
+    def numbers(self, count):
+        # Page numbers that exist in a document of `count` pages
+        return [n for a,b in self for n in range(a,min(b,count)+1)]
+
+def page_list(spec):
+    # '1-20,100' -> PageRanges(((1,20),(100,100)))
+    ranges=[]
+    try:
+        for part in spec.split(','):
+            a,_,b=part.partition('-')
+            a,b=int(a),int(b or a)
+            if b < a:
+                raise argparse.ArgumentTypeError(f'range end before start: {part!r}')
+            ranges.append((a,b))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'invalid page list: {spec!r}')
+    if min(a for a,_ in ranges) < 1:
+        raise argparse.ArgumentTypeError(f'pages start at 1: {spec!r}')
+    merged=[]
+    for a,b in sorted(ranges):
+        if merged and a <= merged[-1][1]+1: merged[-1]=(merged[-1][0],max(b,merged[-1][1]))
+        else: merged.append((a,b))
+    return PageRanges(merged)
+
+def parse_args():
+    p = argparse.ArgumentParser()
+    p.add_argument('-t','--thickness',type=int,default=DEFAULT_THK,
+                   help=f'Insulation thickness (mm) {MIN_THK}-{MAX_THK}')
+    p.add_argument('-p','--pages',type=page_list,default=None,
+                   help='Only read these pages of each PDF, e.g. 1-20,100 (default: all)')
+    args = p.parse_args()
+    if args.thickness < MIN_THK or args.thickness > MAX_THK:
+        sys.exit(f'Error: thickness must be {MIN_THK}-{MAX_THK} mm')
+    return args
+
 # Main
 def main():
+    args=parse_args()
     inp,out=Path('pdf_in'),Path('mto_out'); inp.mkdir(exist_ok=True); out.mkdir(exist_ok=True)
     pdfs=list(inp.glob('*.pdf'))+list(inp.glob('*.PDF'))
     if not pdfs:
         print(f'Drop PDFs into {inp}'); sys.exit(1)
-    all_str=[]; all_fits={}; all_sum={'Clad_m2':0,'Bead_m':0,'Tubes':0,'Bond_tins':0}
-    for pdf in pdfs:
-        s,fits,sm=process_pdf(pdf)
-        all_str+=s
-        for k,v in fits.items(): all_fits.setdefault(k,[]).extend(v)
-        for k in all_sum: all_sum[k]+=sm[k]
+    all_str={}; all_fits={}
+    # PDFs are independent – extract in parallel, aggregate here
+    with ProcessPoolExecutor() as ex:
+        results=list(ex.map(functools.partial(process_pdf,thk=args.thickness,pages=args.pages),pdfs))
+    for s,fits,_ in results:
+        for k,v in s.items(): all_str.setdefault(k,[]).append(v)
+        for k,cols in fits.items():
+            for c,v in cols.items(): all_fits.setdefault(k,{}).setdefault(c,[]).extend(v)
+    summaries=[sm for _,_,sm in results]
+    all_sum={k:sum(sm[k] for sm in summaries) for k in summaries[0]}
     ts=datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
     out_file=out/f'Auto_MTO_{ts}.xlsx'
-    with pd.ExcelWriter(out_file,engine='xlsxwriter') as w:
-        pd.DataFrame(all_str).sort_values('DN').to_excel(w,'Straights',index=False)
-        for sheet,rows in sorted(all_fits.items()):
-            key=sheet
-            df=pd.DataFrame(rows)
-            sort_col=df.columns[1]
-            df.sort_values(sort_col).to_excel(w,key,index=False)
-        pd.DataFrame([all_sum]).to_excel(w,'Summary',index=False)
-        # Autofit
-        for sheet in w.sheets:
-            df=pd.read_excel(out_file,sheet_name=sheet)
-            ws=w.sheets[sheet]
-            for i,col in enumerate(df.columns):
-                ws.set_column(i,i,max(df[col].astype(str).map(len).max(),len(col))+2)
+    str_cols={k:np.concatenate(v) for k,v in all_str.items()}
+    sheets=[('Straights',sort_cols(str_cols,'DN'))]
+    for sheet,cols in sorted(all_fits.items()):
+        cols={c:np.asarray(v) for c,v in cols.items()}
+        sheets.append((sheet,sort_cols(cols,FIT_COLS[sheet][1])))
+    sheets.append(('Summary',{k:np.asarray([v]) for k,v in all_sum.items()}))
+    # constant_memory streams each row to disk once the next one starts, so widths
+    # go in first and rows are written strictly in order
+    with xlsxwriter.Workbook(str(out_file),{'constant_memory':True}) as wb:
+        hdr=wb.add_format({'bold':True,'border':1,'align':'center'})
+        for sheet,cols in sheets:
+            ws=wb.add_worksheet(sheet)
+            for i,(col,v) in enumerate(cols.items()):
+                ws.set_column(i,i,max(col_width(v),len(col))+2)
+            ws.write_row(0,0,list(cols),hdr)
+            for r,row in enumerate(zip(*(v.tolist() for v in cols.values())),1):
+                ws.write_row(r,0,row)
     print(f'Excel saved → {out_file}')
 
 if __name__=='__main__':
+    multiprocessing.freeze_support()  # PyInstaller EXE
     main()